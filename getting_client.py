@@ -1,21 +1,41 @@
+import base64
+import functools
+import inspect
+import json
 import os
 import re
 import time
 from typing import Optional, Any
- 
-from dotenv import load_dotenv # type: ignore
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError # type: ignore
-from impresso import connect # type: ignore
-import urllib.parse  # added
+from urllib.parse import urlsplit, urlunsplit, quote
 
+# dotenv, playwright and impresso are imported inside the functions that need them, so the
+# cached-token fast path in get_impresso_token never pays for loading them.
 
-TOKEN_URL = "https://impresso-project.ch/datalab/token"
 
-# Prefer JWT-like tokens; fallbacks require longer lengths to avoid picking CSRF/session IDs
-JWT_REGEX = r'eyJ[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+'
+TOKEN_URL = "https://impresso-project.ch/datalab/token"
+# Last acquired token, reused across runs while its JWT "exp" is in the future
+TOKEN_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".impresso", "token")
+TOKEN_EXPIRY_LEEWAY_SECONDS = 60
+# Token most recently returned by get_impresso_token (see last_token_expiry)
+_LAST_TOKEN: Optional[str] = None
+
+# Prefer JWT-like tokens; fallbacks require longer lengths to avoid picking CSRF/session IDs.
+# Header and payload are base64url-encoded JSON objects, so both start with "ey"; the header's
+# third char varies with its first key/whitespace ("eyJ", "eyI", "eyA").
+JWT_REGEX = r'ey[AIJ][A-Za-z0-9_-]+\.ey[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+'
 HEX_LONG_REGEX = r'[a-fA-F0-9]{64,}'
 BASE64ISH_LONG_REGEX = r'[A-Za-z0-9_\-]{64,}'
 
+# Compiled once at import; these run against full page content on the fallback path
+JWT_RE = re.compile(JWT_REGEX)
+HEX_RE = re.compile(HEX_LONG_REGEX)
+B64_RE = re.compile(BASE64ISH_LONG_REGEX)
+WS_RE = re.compile(r'\s+')
+HEX_CHARS = frozenset('0123456789abcdefABCDEF')
+BASE64URL_CHARS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_-')
+# Deletes zero-width space/non-joiner and BOM in a single pass
+ZERO_WIDTH_TABLE = str.maketrans('', '', '\u200b\u200c\ufeff')
+
 DEFAULT_EMAIL_SELECTORS = [
     'input[type="email"]',
     'input[name="email"]',
@@ -98,50 +118,6 @@ DEFAULT_PASSWORD_SELECTORS.extend([
     'xpath=//label[contains(normalize-space(.),"Password")]/following::input[1]',
 ])
 
-DEFAULT_SUBMIT_SELECTORS = [
-    'button[type="submit"]',
-    'input[type="submit"]',
-    'button:has-text("Sign in")',
-    'button:has-text("Log in")',
-    'button:has-text("Continue")',
-    'button:has-text("Next")',
-]
-
-DEFAULT_GENERATE_SELECTORS = [
-    'button:has-text("Generate token")',
-    'button:has-text("Generate")',
-    'a:has-text("Generate token")',
-    'a:has-text("Generate")',
-    'text=Generate token',
-]
-
-DEFAULT_TOKEN_SELECTORS = [
-    '[data-testid="token"]',
-    'input[readonly]',
-    'input[type="text"]',
-    'textarea[readonly]',
-    'code',
-    'pre',
-]
-
-# New: triggers for the login modal and common "terms" buttons
-DEFAULT_LOGIN_TRIGGER_SELECTORS = [
-    'button:has-text("LOG IN OR REGISTER")',
-    'text=LOG IN OR REGISTER',
-    'button:has-text("Log in or register")',
-]
-DEFAULT_TERMS_OPEN_SELECTORS = [
-    'button:has-text("READ AND ACCEPT THE TERMS OF USE TO GENERATE THE TOKEN")',
-    'text=READ AND ACCEPT THE TERMS OF USE TO GENERATE THE TOKEN',
-    'button:has-text("TERMS OF USE")',
-]
-DEFAULT_TERMS_ACCEPT_SELECTORS = [
-    'button:has-text("Accept")',
-    'button:has-text("I accept")',
-    'button:has-text("I agree")',
-    'button:has-text("ACCEPT")',
-]
-
 # New: selectors used on the second login choice and form
 DEFAULT_SECOND_LOGIN_CHOICE_SELECTORS = [
     'button:has-text("Log in")',
@@ -150,35 +126,154 @@ DEFAULT_SECOND_LOGIN_CHOICE_SELECTORS = [
     'text=Log in',
 ]
 
+# Selector lists are joined into unions / walked on every lookup, so keep each entry once
+for _name in (
+    'DEFAULT_EMAIL_SELECTORS',
+    'DEFAULT_PASSWORD_SELECTORS',
+    'DEFAULT_SUBMIT_SELECTORS',
+    'DEFAULT_GENERATE_SELECTORS',
+    'DEFAULT_TOKEN_SELECTORS',
+    'DEFAULT_LOGIN_TRIGGER_SELECTORS',
+    'DEFAULT_TERMS_OPEN_SELECTORS',
+    'DEFAULT_TERMS_ACCEPT_SELECTORS',
+    'DEFAULT_SECOND_LOGIN_CHOICE_SELECTORS',
+):
+    globals()[_name] = list(dict.fromkeys(globals()[_name]))
+del _name
+
+
+# Selector engines that cannot be combined into a CSS union ("a, b, c")
+NON_CSS_SELECTOR_PREFIXES = ('xpath=', 'text=', 'role=')
+
+
+def _split_selectors(selectors):
+    css_sels = [s for s in selectors if not s.startswith(NON_CSS_SELECTOR_PREFIXES)]
+    other_sels = [s for s in selectors if s.startswith(NON_CSS_SELECTOR_PREFIXES)]
+    return css_sels, other_sels
+
+
+# Index of the first element (in DOM order) matching the highest-priority selector;
+# `base:has-text("...")` is not native CSS, so it is matched on the element's text here
+PICK_BY_PRIORITY_JS = """(els, selectors) => {
+    const norm = s => (s || '').replace(/\\s+/g, ' ').trim().toLowerCase();
+    for (const sel of selectors) {
+        const m = sel.match(/^(.*):has-text\\((["'])(.*)\\2\\)$/);
+        try {
+            const i = els.findIndex(e => m
+                ? e.matches(m[1] || '*') && norm(e.innerText).includes(norm(m[3]))
+                : e.matches(sel));
+            if (i >= 0) return i;
+        } catch (err) {}
+    }
+    return 0;
+}"""
 
 def _first_selector(page, selectors, timeout_ms=5000):
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError # type: ignore
+
+    # One wait on the union of all CSS selectors instead of one wait per selector;
+    # only engine-prefixed selectors (xpath=, text=, role=) are tried individually.
+    css_sels, other_sels = _split_selectors(selectors)
     last_err = None
-    slice_timeout = max(1000, timeout_ms // max(1, len(selectors)))
-    for sel in selectors:
+    remaining_ms = timeout_ms
+    if css_sels:
+        union_timeout = int(timeout_ms * 0.6) if other_sels else timeout_ms
+        remaining_ms = timeout_ms - union_timeout
         try:
-            el = page.wait_for_selector(sel, timeout=slice_timeout, state="visible")
+            # visible=true: a hidden earlier match must not hide a visible later one
+            union = ", ".join(css_sels) + " >> visible=true"
+            el = page.wait_for_selector(union, timeout=union_timeout, state="visible")
             if el:
-                return el
+                # The union resolves in DOM order; keep the list's priority (e.g. the modal's
+                # submit button over a header button whose text also contains "Log in")
+                # with a single in-page pass over the visible matches
+                idx = page.eval_on_selector_all(union, PICK_BY_PRIORITY_JS, css_sels)
+                return page.locator(union).nth(idx) if idx else el
         except Exception as e:
             last_err = e
+    if other_sels:
+        slice_timeout = max(1000, remaining_ms // len(other_sels))
+        for sel in other_sels:
+            try:
+                el = page.wait_for_selector(sel, timeout=slice_timeout, state="visible")
+                if el:
+                    return el
+            except Exception as e:
+                last_err = e
     if last_err:
         raise last_err
     raise PlaywrightTimeoutError("No selector matched")
 
+def _poll_interval_ms(elapsed_s: float) -> int:
+    # Pause between probe rounds: react quickly while the page is likely still rendering,
+    # then back off
+    if elapsed_s < 0.5:
+        return 25
+    if elapsed_s < 2.0:
+        return 100
+    return 200
+
+
+# Length of each per-frame wait in _first_selector_any_frame (what a frame without a match costs per round)
+FRAME_PROBE_TIMEOUT_MS = 500
+
+
+def _sleep_between_rounds(started: float, deadline: float) -> None:
+    pause_s = min(_poll_interval_ms(time.monotonic() - started) / 1000.0, deadline - time.monotonic())
+    if pause_s > 0:
+        time.sleep(pause_s)
+
+
 # New: search for the first visible selector across all frames (helps when login form is inside an iframe)
 def _first_selector_any_frame(page, selectors, timeout_ms=5000):
-    deadline = time.time() + (timeout_ms / 1000.0)
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError # type: ignore
+
+    # CSS selectors are awaited as one union per frame via locators, so Playwright's
+    # in-browser retry loop does the polling. Frames (nested ones included, main document
+    # first) are probed with short waits in rounds, so a login form in a later iframe is
+    # found even when an earlier one (cookie banner, analytics) never matches.
+    # Engine-prefixed selectors are probed per frame until the deadline.
+    css_sels, other_sels = _split_selectors(selectors)
+    deadline = time.monotonic() + (timeout_ms / 1000.0)
     last_err = None
-    while time.time() < deadline:
-        for sel in selectors:
+    if css_sels:
+        union = ", ".join(css_sels) + " >> visible=true"
+        share_ms = timeout_ms if not other_sels else int(timeout_ms * 0.6)
+        started = time.monotonic()
+        union_deadline = started + (share_ms / 1000.0)
+        while True:
             for frame in page.frames:
+                probe_ms = int((union_deadline - time.monotonic()) * 1000)
+                if probe_ms <= 0:
+                    break
+                loc = frame.locator(union).first
                 try:
-                    el = frame.wait_for_selector(sel, state="visible", timeout=750)
-                    if el:
-                        return el
+                    loc.wait_for(state="visible", timeout=min(FRAME_PROBE_TIMEOUT_MS, probe_ms))
+                    return loc
                 except Exception as e:
                     last_err = e
-        time.sleep(0.1)
+            if time.monotonic() >= union_deadline:
+                break
+            _sleep_between_rounds(started, union_deadline)
+    if other_sels:
+        # Probe every (selector, frame) pair in rounds so no single wait eats the budget,
+        # backing off between rounds (fast at first, fewer round trips later)
+        started = time.monotonic()
+        while True:
+            for sel in other_sels:
+                for frame in page.frames:
+                    probe_ms = int((deadline - time.monotonic()) * 1000)
+                    if probe_ms <= 0:
+                        break
+                    try:
+                        el = frame.wait_for_selector(sel, state="visible", timeout=min(FRAME_PROBE_TIMEOUT_MS, probe_ms))
+                        if el:
+                            return el
+                    except Exception as e:
+                        last_err = e
+            if time.monotonic() >= deadline:
+                break
+            _sleep_between_rounds(started, deadline)
     if last_err:
         raise last_err
     raise PlaywrightTimeoutError("No selector matched in any frame")
@@ -189,24 +284,51 @@ def _clean_token_artifacts(s: str) -> str:
         return s
     # Trim whitespace and remove common surrounding quotes and zero-width chars
     s = s.strip().strip('"').strip("'")
-    s = s.replace('\u200b', '').replace('\u200c', '').replace('\ufeff', '')
-    # Also remove actual zero-width characters if present
-    s = s.replace('\u200b', '').replace('\u200c', '').replace('\ufeff', '')
+    s = s.translate(ZERO_WIDTH_TABLE)
     # Collapse whitespace within
-    return re.sub(r'\s+', '', s)
+    return WS_RE.sub('', s)
 
 
 def _is_plausible_token(tok: str) -> bool:
     if not tok:
         return False
-    tok = tok.strip()
-    if re.fullmatch(JWT_REGEX, tok):
-        return True
-    if re.fullmatch(HEX_LONG_REGEX, tok):
-        return True
-    if re.fullmatch(BASE64ISH_LONG_REGEX, tok):
-        return True
-    return False
+    return _is_plausible_token_cached(tok.strip())
+
+
+@functools.lru_cache(maxsize=128)
+def _is_plausible_token_cached(tok: str) -> bool:
+    # Real tokens are never this short; skips the regexes for CSRF/session ids
+    if len(tok) < 40:
+        return False
+    # JWT first: anchored and cheap. Anything dotted can only ever be a JWT.
+    if '.' in tok:
+        return tok.count('.') == 2 and bool(JWT_RE.fullmatch(tok))
+    # Character-set checks equivalent to fullmatching HEX_RE / B64_RE, without the regex
+    chars = set(tok)
+    if chars <= HEX_CHARS:
+        return len(tok) >= 64
+    return len(tok) >= 64 and chars <= BASE64URL_CHARS
+
+# Debug snapshots of visible form controls, collected in-page (offsetParent !== null ~ visible)
+DEBUG_INPUTS_JS = """() => Array.from(document.querySelectorAll('input'))
+    .filter(e => e.offsetParent !== null)
+    .slice(0, 25)
+    .map(e => ({
+        type: (e.getAttribute('type') || '').toLowerCase(),
+        name: e.getAttribute('name') || '',
+        id: e.id || '',
+        placeholder: e.getAttribute('placeholder') || '',
+        aria: e.getAttribute('aria-label') || '',
+    }))"""
+DEBUG_BUTTONS_JS = """() => Array.from(document.querySelectorAll("button, input[type='submit'], a[role='button']"))
+    .filter(e => e.offsetParent !== null)
+    .slice(0, 25)
+    .map(e => ({
+        tag: e.tagName,
+        text: (e.innerText || '').trim().replace(/\\n/g, ' ').slice(0, 80),
+        value: e.getAttribute('value') || '',
+    }))"""
+
 
 # New: dump what we see for debugging the first login UI
 def _dump_login_debug(page) -> None:
@@ -233,76 +355,51 @@ def _dump_login_debug(page) -> None:
     except Exception:
         pass
 
-    # Visible inputs
-    def _safe(el, attr):
-        try:
-            return el.get_attribute(attr) or ""
-        except Exception:
-            return ""
-
+    # Visible inputs: one evaluate per frame returns a snapshot instead of an RPC per attribute
     try:
         print("    [debug] visible inputs (first 25 per frame):")
         for idx, f in enumerate(page.frames):
             try:
-                els = f.query_selector_all("input")
+                inputs = f.evaluate(DEBUG_INPUTS_JS)
             except Exception:
                 continue
-            shown = 0
-            for el in els:
-                try:
-                    if not el.is_visible():
-                        continue
-                except Exception:
-                    continue
-                t = (_safe(el, "type") or "").lower()
-                name = _safe(el, "name")
-                fid = _safe(el, "id")
-                ph = _safe(el, "placeholder")
-                aria = _safe(el, "aria-label")
-                print(f"      frame[{idx}] <input type='{t}' name='{name}' id='{fid}' placeholder='{ph}' aria-label='{aria}'>")
-                shown += 1
-                if shown >= 25:
-                    break
+            for d in inputs:
+                print(f"      frame[{idx}] <input type='{d['type']}' name='{d['name']}' id='{d['id']}' placeholder='{d['placeholder']}' aria-label='{d['aria']}'>")
     except Exception:
         pass
 
     # Visible buttons/submit/links
     try:
         print("    [debug] visible buttons/submit/links (first 25 per frame):")
-        btn_sel = "button, input[type='submit'], a[role='button']"
         for idx, f in enumerate(page.frames):
             try:
-                els = f.query_selector_all(btn_sel)
+                buttons = f.evaluate(DEBUG_BUTTONS_JS)
             except Exception:
                 continue
-            shown = 0
-            for el in els:
-                try:
-                    if not el.is_visible():
-                        continue
-                except Exception:
-                    continue
-                tag = ""
-                try:
-                    tag = el.evaluate("e => e.tagName")
-                except Exception:
-                    pass
-                text = ""
-                try:
-                    # inner_text can be expensive; keep short
-                    text = (el.inner_text() or "").strip().replace("\n", " ")
-                except Exception:
-                    pass
-                val = _safe(el, "value")
-                print(f"      frame[{idx}] <{tag}> text='{text[:80]}' value='{val}'")
-                shown += 1
-                if shown >= 25:
-                    break
+            for d in buttons:
+                print(f"      frame[{idx}] <{d['tag']}> text='{d['text']}' value='{d['value']}'")
     except Exception:
         pass
 
 
+# Login is done once no password field is visible any more (hidden ones may stay in the DOM)
+# or the token element is already shown; evaluated in the frame that held the form
+LOGIN_DONE_JS = """() => !Array.from(document.querySelectorAll('input[type=password]')).some(e => e.offsetParent !== null)
+    || !!document.querySelector('[data-testid=token], input[readonly]')"""
+
+
+def _owner_frame(page, el):
+    # el is an ElementHandle or a Locator; fall back to the main frame if it cannot be resolved
+    try:
+        handle = el.element_handle(timeout=1000) if hasattr(el, "element_handle") else el
+        return handle.owner_frame() or page.main_frame
+    except Exception:
+        return page.main_frame
+
+
 def _attempt_login(page, email: Optional[str], password: Optional[str], timeout_ms=15000) -> bool:
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError # type: ignore
+
     if not email or not password:
         return False
     # Find email/username field
@@ -326,24 +423,38 @@ def _attempt_login(page, email: Optional[str], password: Optional[str], timeout_
 
     email_el.fill(email)
 
-    # Find password field
+    # Find password field. It lives in the same form as the email field, so if it is
+    # already rendered take it directly and skip the full fallback chain below.
+    pwd_el = None
+    pwd_css, _ = _split_selectors(DEFAULT_PASSWORD_SELECTORS)
     try:
-        pwd_el = _first_selector(page, DEFAULT_PASSWORD_SELECTORS, 5000)
-        print("    [debug] login: found password by selector.")
-    except PlaywrightTimeoutError:
+        pwd_loc = page.locator(", ".join(pwd_css) + " >> visible=true").first
+        pwd_loc.wait_for(state="attached", timeout=1000)
+        pwd_el = pwd_loc
+        print("    [debug] login: found password next to username/email.")
+    except Exception:
+        pass
+
+    if pwd_el is None:
         try:
-            pwd_el = _first_selector_any_frame(page, DEFAULT_PASSWORD_SELECTORS, timeout_ms=5000)
-            print("    [debug] login: found password inside an iframe by selector.")
+            pwd_el = _first_selector(page, DEFAULT_PASSWORD_SELECTORS, 5000)
+            print("    [debug] login: found password by selector.")
         except PlaywrightTimeoutError:
             try:
-                pwd_el = _find_input_by_placeholder(page, PASSWORD_PLACEHOLDER_KEYWORDS, types=("password","text",None), timeout_ms=5000)
-                print("    [debug] login: found password by placeholder/aria-label.")
+                pwd_el = _first_selector_any_frame(page, DEFAULT_PASSWORD_SELECTORS, timeout_ms=5000)
+                print("    [debug] login: found password inside an iframe by selector.")
             except PlaywrightTimeoutError:
-                print("    [debug] login: password field not found. Dumping page info...")
-                _dump_login_debug(page)
-                return False
+                try:
+                    pwd_el = _find_input_by_placeholder(page, PASSWORD_PLACEHOLDER_KEYWORDS, types=("password","text",None), timeout_ms=5000)
+                    print("    [debug] login: found password by placeholder/aria-label.")
+                except PlaywrightTimeoutError:
+                    print("    [debug] login: password field not found. Dumping page info...")
+                    _dump_login_debug(page)
+                    return False
 
     pwd_el.fill(password)
+    # Resolved before submitting: the field (and its frame) may go away afterwards
+    form_frame = _owner_frame(page, pwd_el)
 
     # Submit
     try:
@@ -356,8 +467,10 @@ def _attempt_login(page, email: Optional[str], password: Optional[str], timeout_
         except Exception:
             pwd_el.press("Enter")
 
+    # Wait for the actual post-condition (form gone or token visible) rather than networkidle,
+    # which never settles on pages with analytics/websockets
     try:
-        page.wait_for_load_state("networkidle", timeout=20000)
+        form_frame.wait_for_function(LOGIN_DONE_JS, timeout=15000)
     except Exception:
         pass
     return True
@@ -371,8 +484,9 @@ def _click_generate(page, custom_selector: Optional[str]) -> None:
     for sel in candidates:
         try:
             page.click(sel, timeout=5000)
+            # Wait for the token element to show up
             try:
-                page.wait_for_load_state("networkidle", timeout=10000)
+                page.wait_for_selector(DEFAULT_TOKEN_SELECTORS[0], timeout=5000)
             except Exception:
                 pass
             return
@@ -381,51 +495,104 @@ def _click_generate(page, custom_selector: Optional[str]) -> None:
     raise RuntimeError("Could not find/click the 'Generate token' button. Set GENERATE_SELECTOR in .env")
 
 
+# Value (inputs/textareas) and rendered text of a token candidate element
+ELEMENT_VALUE_AND_TEXT_JS = "e => ({val: 'value' in e ? e.value : '', text: e.innerText || ''})"
+
+# Playwright-only selector syntax that document.querySelectorAll rejects: engine prefixes
+# (xpath=, css=, data-testid=, ...), ">>" chains and Playwright pseudo-classes
+PLAYWRIGHT_ONLY_SELECTOR_RE = re.compile(
+    r'^[\w-]+=|>>|:(?:has-text|text|text-is|text-matches|visible|nth-match|left-of|right-of|above|below|near)\b'
+)
+
+# Every token-length value/text under the given plain CSS selectors, in selector order; null while none
+# Only values containing a token-shaped string (same patterns as _token_from_text, after
+# stripping whitespace/zero-width chars) count, so other long text such as a code sample
+# does not end the wait before the token has rendered.
+TOKEN_CANDIDATES_JS = """({selectors, patterns}) => {
+    const res = patterns.map(p => new RegExp(p));
+    const out = [];
+    for (const s of selectors) {
+        let els;
+        try { els = document.querySelectorAll(s); } catch (err) { continue; }
+        for (const e of els) {
+            const val = ('value' in e && typeof e.value === 'string') ? e.value : '';
+            const v = (val || e.innerText || '').trim();
+            if (v.length < 40) continue;
+            const compact = v.replace(/[\\s\\u200b\\u200c\\ufeff]+/g, '');
+            if (res.some(re => re.test(compact))) out.push(v);
+        }
+    }
+    return out.length ? out : null;
+}"""
+
+
+def _token_from_text(txt: str) -> Optional[str]:
+    txt = _clean_token_artifacts((txt or "").strip())
+    # Only accept plausible tokens to avoid CSRF/session ids
+    if _is_plausible_token(txt):
+        return txt
+    # Pick JWT first, then long hex or long base64ish
+    m = JWT_RE.search(txt) or HEX_RE.search(txt) or B64_RE.search(txt)
+    return m.group(0) if m else None
+
+
+def _token_from_selector(page, sel: str, timeout_ms=3000) -> Optional[str]:
+    try:
+        el = page.wait_for_selector(sel, timeout=timeout_ms)
+        if not el:
+            return None
+        data = el.evaluate(ELEMENT_VALUE_AND_TEXT_JS) or {}
+        return _token_from_text(str(data.get("val") or "")) or _token_from_text(data.get("text") or "")
+    except Exception:
+        return None
+
+
 def _extract_token(page, custom_selector: Optional[str]) -> str:
-    candidates = []
+    # An explicit TOKEN_SELECTOR wins over the defaults, and goes through Playwright so that
+    # its selector syntax (:has-text(), >> chains, css=/id=/data-testid= engines) works
     if custom_selector:
-        candidates.append(custom_selector)
-    candidates.extend(DEFAULT_TOKEN_SELECTORS)
+        token = _token_from_selector(page, custom_selector)
+        if token:
+            return token
 
-    # Try straightforward elements first
-    for sel in candidates:
-        try:
-            el = page.wait_for_selector(sel, timeout=3000)
-            if not el:
-                continue
-            # Prefer value for inputs/textarea
-            try:
-                val = el.input_value()
-                token = _clean_token_artifacts((val or "").strip())
-                # Only accept plausible tokens to avoid CSRF/session ids
-                if _is_plausible_token(token):
-                    return token
-            except Exception:
-                txt = _clean_token_artifacts((el.inner_text() or "").strip())
-                # Pick JWT first
-                m = re.search(JWT_REGEX, txt)
-                if m:
-                    return m.group(0)
-                # Fallback: long hex or long base64ish
-                m = re.search(HEX_LONG_REGEX, txt)
-                if m:
-                    return m.group(0)
-                m = re.search(BASE64ISH_LONG_REGEX, txt)
-                if m:
-                    return m.group(0)
-        except Exception:
-            continue
+    css_sels = [s for s in DEFAULT_TOKEN_SELECTORS if not PLAYWRIGHT_ONLY_SELECTOR_RE.search(s)]
+    other_sels = [s for s in DEFAULT_TOKEN_SELECTORS if PLAYWRIGHT_ONLY_SELECTOR_RE.search(s)]
 
-    # Fallback: scan whole page content
-    html = _clean_token_artifacts(page.content())
-    for rx in [
-        JWT_REGEX,
-        HEX_LONG_REGEX,
-        BASE64ISH_LONG_REGEX,
-    ]:
-        m = re.search(rx, html)
+    # Try straightforward elements first: one in-page scan over the plain CSS selectors,
+    # re-evaluated by the browser until something token-sized shows up
+    try:
+        handle = page.wait_for_function(
+            TOKEN_CANDIDATES_JS,
+            arg={"selectors": css_sels, "patterns": [JWT_REGEX, HEX_LONG_REGEX, BASE64ISH_LONG_REGEX]},
+            timeout=3000,
+        )
+        for raw in handle.json_value() or []:
+            token = _token_from_text(raw)
+            if token:
+                return token
+    except Exception:
+        pass
+
+    # Playwright-only selectors cannot be resolved by the in-page scan
+    for sel in other_sels:
+        token = _token_from_selector(page, sel)
+        if token:
+            return token
+
+    # Fallback: scan the visible body text (much smaller than serialized HTML)
+    try:
+        body_text = _clean_token_artifacts(page.evaluate("() => document.body ? document.body.innerText : ''") or "")
+        m = JWT_RE.search(body_text)
         if m:
             return m.group(0)
+    except Exception:
+        pass
+
+    # Last resort: scan whole page content (tokens may only live in attributes)
+    html = _clean_token_artifacts(page.content())
+    m = JWT_RE.search(html) or HEX_RE.search(html) or B64_RE.search(html)
+    if m:
+        return m.group(0)
 
     raise RuntimeError("Could not extract token. Set TOKEN_SELECTOR in .env to a specific element.")
 
@@ -463,9 +630,9 @@ def _accept_terms_if_needed(page) -> None:
     for sel in DEFAULT_TERMS_ACCEPT_SELECTORS:
         try:
             page.click(sel, timeout=4000)
-            # Wait for dialog to disappear/network to settle
+            # Wait for the dialog (and its accept button) to disappear
             try:
-                page.wait_for_load_state("networkidle", timeout=8000)
+                page.wait_for_selector(sel, state="hidden", timeout=5000)
             except Exception:
                 pass
             return
@@ -487,6 +654,19 @@ def _goto_with_retries(page, url: str, attempts: int = 3):
     except Exception:
         raise last_err or e
 
+# Resource types the token flow never needs. Stylesheets are kept on purpose: the
+# visibility checks on login/terms buttons depend on CSS display rules.
+BLOCKED_RESOURCE_TYPES = ("image", "font", "media")
+
+
+def _route_block_heavy_resources(route) -> None:
+    req = route.request
+    if req.resource_type in BLOCKED_RESOURCE_TYPES and "token" not in req.url:
+        route.abort()
+    else:
+        route.continue_()
+
+
 # New: small helpers for 401 handling
 def _get_status(resp) -> int | None:
     try:
@@ -495,7 +675,6 @@ def _get_status(resp) -> int | None:
         return None
 
 def _inject_basic_auth(url: str, username: str, password: str) -> str:
-    from urllib.parse import urlsplit, urlunsplit, quote
     parts = urlsplit(url)
     host = parts.hostname or ""
     port = f":{parts.port}" if parts.port else ""
@@ -504,17 +683,94 @@ def _inject_basic_auth(url: str, username: str, password: str) -> str:
     return urlunsplit((parts.scheme, netloc, parts.path, parts.query, parts.fragment))
 
 
-def get_impresso_token() -> str:
+def _jwt_expiry(token: str) -> float | None:
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        exp = claims.get("exp")
+        return float(exp) if exp is not None else None
+    except Exception:
+        return None
+
+
+def _usable_cached_token(token: Optional[str], min_validity_seconds: float = TOKEN_EXPIRY_LEEWAY_SECONDS) -> Optional[str]:
+    if not token:
+        return None
+    token = _clean_token_artifacts(token)
+    if not _is_plausible_token(token):
+        return None
+    # Only JWTs carry an expiry we can check; other token formats are taken as-is
+    if JWT_RE.fullmatch(token):
+        exp = _jwt_expiry(token)
+        if exp is not None and exp <= time.time() + min_validity_seconds:
+            return None
+    return token
+
+
+def _read_cached_token() -> Optional[str]:
+    try:
+        with open(TOKEN_CACHE_FILE, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except Exception:
+        return None
+
+
+def _write_cached_token(token: str) -> None:
+    try:
+        os.makedirs(os.path.dirname(TOKEN_CACHE_FILE), mode=0o700, exist_ok=True)
+        fd = os.open(TOKEN_CACHE_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(token)
+        os.chmod(TOKEN_CACHE_FILE, 0o600)
+    except Exception as e:
+        print(f"    Could not cache token at {TOKEN_CACHE_FILE}: {e}")
+
+
+def _remember_token(token: str) -> None:
+    global _LAST_TOKEN
+    _LAST_TOKEN = token
+
+
+def last_token_expiry() -> Optional[float]:
+    """
+    Expiry (epoch seconds, from the JWT "exp" claim) of the token most recently returned by
+    get_impresso_token, or None if unknown. A reused cached token can expire much sooner
+    than a freshly generated one, so long-running callers should refresh before this.
+    """
+    return _jwt_expiry(_LAST_TOKEN) if _LAST_TOKEN else None
+
+
+def get_impresso_token(use_cache: bool = True, min_validity_seconds: float = TOKEN_EXPIRY_LEEWAY_SECONDS) -> str:
+    """
+    Return a valid Impresso API token.
+
+    A token from IMPRESSO_TOKEN or the cache file that is still valid for at least
+    min_validity_seconds is returned without launching a browser; pass use_cache=False to
+    force the interactive flow (e.g. after a 401).
+    """
+    if use_cache:
+        # An inherited IMPRESSO_TOKEN is checked first and needs no disk I/O; the cache file is
+        # only read if it is missing or expired. Both run before .env is parsed.
+        cached = (
+            _usable_cached_token(os.environ.get("IMPRESSO_TOKEN"), min_validity_seconds)
+            or _usable_cached_token(_read_cached_token(), min_validity_seconds)
+        )
+        if cached:
+            print("    Reusing cached Impresso token.")
+            _remember_token(cached)
+            return cached
+
+    from dotenv import load_dotenv # type: ignore
+    from playwright.sync_api import sync_playwright # type: ignore
+
     load_dotenv()
 
     headless = os.getenv("HEADLESS", "true").lower() != "false"
     first_email = os.getenv("FIRST_EMAIL")
     first_password = os.getenv("FIRST_PASSWORD")
-    # Support either BASIC_AUTH_* or fallback to SECOND_* (kept for completeness)
-    basic_user = os.getenv("BASIC_AUTH_USER") or os.getenv("SECOND_EMAIL")
-    basic_pass = os.getenv("BASIC_AUTH_PASSWORD") or os.getenv("SECOND_PASSWORD")
     custom_generate_selector = os.getenv("GENERATE_SELECTOR")
     custom_token_selector = os.getenv("TOKEN_SELECTOR")
+    block_assets = os.getenv("IMPRESSO_BLOCK_ASSETS", "0") == "1"
 
     # Second-login credentials (UI form)
     second_email = os.getenv("SECOND_EMAIL")
@@ -523,6 +779,21 @@ def get_impresso_token() -> str:
     if not first_email or not first_password:
         raise RuntimeError("Missing FIRST_EMAIL/FIRST_PASSWORD in .env")
 
+    # HTTP Basic Auth candidates: BASIC_AUTH_*, then SECOND_*, then FIRST_*. The first one is
+    # set on the context up front, answering only challenges from the token page's origin, so
+    # a 401 never forces a rebuild. The site-login FIRST_* password is never sent up front;
+    # it is only tried on the credential-in-URL fallback after the token page returned 401.
+    basic_auth_candidates = []
+    for user, pwd in (
+        (os.getenv("BASIC_AUTH_USER"), os.getenv("BASIC_AUTH_PASSWORD")),
+        (second_email, second_password),
+        (first_email, first_password),
+    ):
+        if user and pwd and (user, pwd) not in basic_auth_candidates:
+            basic_auth_candidates.append((user, pwd))
+    token_parts = urlsplit(TOKEN_URL)
+    token_origin = f"{token_parts.scheme}://{token_parts.netloc}"
+
     print("[1/5] Launching browser...")
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=headless)
@@ -530,10 +801,17 @@ def get_impresso_token() -> str:
             "ignore_https_errors": True,
             "user_agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36",
         }
-        if basic_user and basic_pass:
-            context_kwargs["http_credentials"] = {"username": basic_user, "password": basic_pass}
+        ba_user, ba_pass = basic_auth_candidates[0]
+        if (ba_user, ba_pass) != (first_email, first_password):
+            context_kwargs["http_credentials"] = {
+                "username": ba_user,
+                "password": ba_pass,
+                "origin": token_origin,
+            }
 
         context = browser.new_context(**context_kwargs)
+        if block_assets:
+            context.route("**/*", _route_block_heavy_resources)
         page = context.new_page()
 
         print("[2/5] Navigating to token page...")
@@ -546,45 +824,19 @@ def get_impresso_token() -> str:
             title = ""
 
         if status == 401 or "401" in title:
-            print(f"    Got 401 (status={status}, title='{title}'). Retrying with HTTP Basic Auth...")
-            # Choose credentials for Basic Auth: prefer BASIC_AUTH_*, then FIRST_*, then SECOND_*
-            ba_user = os.getenv("BASIC_AUTH_USER") or first_email or second_email
-            ba_pass = os.getenv("BASIC_AUTH_PASSWORD") or first_password or second_password
-            if not ba_user or not ba_pass:
-                raise RuntimeError("401 received and no BASIC_AUTH_USER/BASIC_AUTH_PASSWORD (or FIRST_*/SECOND_*) available in .env")
-
-            # Recreate context with http_credentials
-            try:
-                page.close()
-            except Exception:
-                pass
-            try:
-                context.close()
-            except Exception:
-                pass
-
-            print("    Recreating context with http_credentials and retrying navigation...")
-            context_kwargs["http_credentials"] = {"username": ba_user, "password": ba_pass}
-            context = browser.new_context(**context_kwargs)
-            page = context.new_page()
-            resp = _goto_with_retries(page, TOKEN_URL)
-            status = _get_status(resp)
-            try:
-                title = page.title() or ""
-            except Exception:
-                title = ""
-
-            if status == 401 or "401" in title:
-                print("    Still 401 after http_credentials. Trying credential-in-URL fallback...")
-                auth_url = _inject_basic_auth(TOKEN_URL, ba_user, ba_pass)
+            print(f"    Got 401 (status={status}, title='{title}'). Trying credential-in-URL fallback...")
+            for user, pwd in basic_auth_candidates:
+                auth_url = _inject_basic_auth(TOKEN_URL, user, pwd)
                 resp = _goto_with_retries(page, auth_url)
                 status = _get_status(resp)
                 try:
                     title = page.title() or ""
                 except Exception:
                     title = ""
-                if status == 401 or "401" in title:
-                    raise RuntimeError("Still 401 after trying http_credentials and credential-in-URL fallback. Check BASIC_AUTH_* in .env.")
+                if not (status == 401 or "401" in title):
+                    break
+            else:
+                raise RuntimeError("Still 401 after trying http_credentials and credential-in-URL fallback. Check BASIC_AUTH_* in .env.")
 
         print(f"    Reached token page (status={status or 'unknown'}).")
 
@@ -650,10 +902,12 @@ def get_impresso_token() -> str:
     if not token or not _is_plausible_token(token):
         raise RuntimeError("Token is empty or could not be extracted, or does not look valid.")
     print(f"    Copied token ({len(token)} chars).")
+    _write_cached_token(token)
+    _remember_token(token)
     return token
 
 
-def get_impresso_client() -> Any:
+def get_impresso_client(use_cache: bool = True, min_validity_seconds: float = TOKEN_EXPIRY_LEEWAY_SECONDS) -> Any:
     """
     Acquire an Impresso API client by performing the automated authentication flow.
     Usage from another module:
@@ -661,27 +915,40 @@ def get_impresso_client() -> Any:
         from testing_client import get_impresso_client
         client = get_impresso_client()
 
+    Args:
+        use_cache: Reuse a still-valid cached token instead of logging in again.
+        min_validity_seconds: A cached JWT is only reused if it is valid for at least this long.
+
     Returns:
         The connected Impresso client instance.
     Raises:
         RuntimeError: If a valid token cannot be retrieved.
     """
-    token = get_impresso_token()
+    token = get_impresso_token(use_cache=use_cache, min_validity_seconds=min_validity_seconds)
     return _connect_with_token(token)
 
 
+@functools.lru_cache(maxsize=1)
+def _connect_supports_token() -> bool:
+    from impresso import connect # type: ignore
+
+    try:
+        params = inspect.signature(connect).parameters
+    except (TypeError, ValueError):
+        return True  # not introspectable; just try the kwarg
+    return "token" in params or any(p.kind is inspect.Parameter.VAR_KEYWORD for p in params.values())
+
+
 def _connect_with_token(token: str):
+    from impresso import connect # type: ignore
+
     # Export for clients that read env
     os.environ["IMPRESSO_TOKEN"] = token
     os.environ["IMPRESSO_API_TOKEN"] = token
 
-    # Prefer explicit kwarg if supported
-    try:
+    # Prefer explicit kwarg if supported; real errors (network, auth) propagate
+    if _connect_supports_token():
         return connect(token=token)
-    except TypeError:
-        pass
-    except Exception:
-        pass
 
     # Fallback: monkeypatch prompt functions BEFORE calling connect()
     import getpass
@@ -700,31 +967,43 @@ def _connect_with_token(token: str):
 
 
 # Helper: find an input by placeholder/aria-label keywords (case-insensitive)
+FIND_INPUT_BY_PLACEHOLDER_JS = """({keywords, types}) => {
+    const kw = keywords.map(k => k.toLowerCase());
+    for (const inp of document.querySelectorAll('input')) {
+        if (inp.offsetParent === null) continue;
+        const t = (inp.getAttribute('type') || '').toLowerCase();
+        if (types.length && !types.includes(t)) continue;
+        const s = ((inp.getAttribute('placeholder') || '') + ' ' + (inp.getAttribute('aria-label') || '')).toLowerCase();
+        if (kw.some(k => s.includes(k))) return inp;
+    }
+    return null;
+}"""
+
+
 def _find_input_by_placeholder(page, keywords, types=("text", "email", "password", None), timeout_ms=5000):
-    deadline = time.time() + (timeout_ms / 1000.0)
-    lowered = [k.lower() for k in keywords]
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError # type: ignore
+
+    # The match runs in-page, so only the hit crosses the wire. A missing type attribute is ''.
+    # All frames are swept in rounds (one evaluate per frame, no waiting), backing off between
+    # rounds, so an input already present in any frame is found on the first round.
+    arg = {
+        "keywords": list(keywords),
+        "types": [t or "" for t in types] if types else [],
+    }
+    started = time.monotonic()
+    deadline = started + (timeout_ms / 1000.0)
     last_err = None
-    while time.time() < deadline:
-        try:
-            for frame in page.frames:
-                inputs = frame.query_selector_all("input")
-                for el in inputs:
-                    try:
-                        if not el.is_visible():
-                            continue
-                    except Exception:
-                        continue
-                    t = (el.get_attribute("type") or "").lower() or None
-                    if types and t not in types:
-                        continue
-                    ph = (el.get_attribute("placeholder") or "")
-                    aria = (el.get_attribute("aria-label") or "")
-                    labelish = f"{ph} {aria}".strip().lower()
-                    if any(k in labelish for k in lowered):
-                        return el
-        except Exception as e:
-            last_err = e
-        time.sleep(0.2)
+    while True:
+        for frame in page.frames:
+            try:
+                el = frame.evaluate_handle(FIND_INPUT_BY_PLACEHOLDER_JS, arg).as_element()
+                if el:
+                    return el
+            except Exception as e:
+                last_err = e  # e.g. frame detached or navigating
+        if time.monotonic() >= deadline:
+            break
+        _sleep_between_rounds(started, deadline)
     raise PlaywrightTimeoutError(f"No input found by placeholder among {keywords}. Last error: {last_err}")
 
 
@@ -741,8 +1020,9 @@ def _open_second_login_choice(page, timeout_ms: int = 5000) -> None:
                 page.click('text=Log in', timeout=1500)
             except Exception:
                 pass
+        # The form itself is awaited by _select_second_login_form
         try:
-            page.wait_for_load_state('networkidle', timeout=4000)
+            page.wait_for_load_state('domcontentloaded', timeout=4000)
         except Exception:
             pass
     except Exception:
@@ -1,4 +1,8 @@
+import asyncio
+import hashlib
 import random
+import sqlite3
+import threading
 import time
 from impresso import DateRange # type: ignore
 from impresso.client import ImpressoClient # type: ignore
@@ -6,21 +10,53 @@ from impresso.client import ImpressoClient # type: ignore
 # Ensure local directory is importable for helper module
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
 import logging
 import json
-from typing import Callable  # added
+from typing import Any, Callable  # added
+
+try:
+    import orjson  # type: ignore  # optional, faster (de)serialization
+except ImportError:
+    orjson = None
 
 
 # Configuration
 INPUT_NEWSAGENCIES_FILE = "all_newsagencies.txt"
 OUTPUT_JSON_FILE = "newsagencies_by_article.json"
+# Append-only progress log (doc_ids streamed per agency), compacted into OUTPUT_JSON_FILE at the end
+OUTPUT_JSONL_FILE = "newsagencies_by_article.jsonl"
+OUTPUT_BUFFER_BYTES = 1 << 20  # 1 MiB write buffer for the progress log
+FSYNC_EVERY_AGENCIES = 32  # flush + fsync the progress log after this many finished agencies
 CLIENT_REFRESH_INTERVAL_SECONDS = 27000  # 7.5 hours
 CLIENT_REFRESH_HINT_INTERVAL_SECONDS = 900  # 15 minutes
 # Refresh a bit before TTL (default 10 minutes), can override via env REFRESH_SAFETY_SECONDS
 REFRESH_SAFETY_SECONDS = int(os.getenv("REFRESH_SAFETY_SECONDS", "600"))
+# Auth errors within this window after a refresh reuse the fresh client instead of logging in again
+FORCE_REFRESH_MIN_INTERVAL_SECONDS = 60
+# Year/newspaper facet responses are cached on disk so resumed runs skip them
+FACET_CACHE_DB = ".facet_cache.db"
+FACET_CACHE_TTL_SECONDS = 7 * 24 * 3600  # 7 days
+FACET_CACHE_MEMORY_SIZE = 4096
+
+_FACET_MEMORY: dict[str, dict] = {}
+# One SQLite connection per process, shared by the worker threads
+_FACET_DB: sqlite3.Connection | None = None
+_FACET_DB_LOCK = threading.Lock()
+# Keyword/date-range queries whose year facet came back empty (loaded from FACET_CACHE_DB)
+_EMPTY_QUERIES: set[str] | None = None
+# Connection pool of the Impresso HTTP client (requests are concurrent, see run_all_newsagencies)
+HTTP_MAX_CONNECTIONS = 32
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 16
+# Newspaper facets of the next years fetched ahead while a year's articles are sampled
+FACET_LOOKAHEAD_YEARS = 2
+# One shared DateRange per calendar year instead of one per request
+YEAR_RANGES: dict[int, DateRange] = {
+    y: DateRange(f"{y}-01-01", f"{y}-12-31") for y in range(1700, 2050)
+}
 
 
 def setup_logging(log_filename: str = "sampling_log.txt"):
@@ -67,43 +103,261 @@ def setup_logging(log_filename: str = "sampling_log.txt"):
 logger = setup_logging()
 
 
-def sample_impresso_uids(
-    client: ImpressoClient | Callable[..., ImpressoClient],
-    keyword: str,
-    start_date: str | None = None,
-    end_date: str | None = None,
-    limit_per_query: int = 20,
-    max_hits: int = 20,
-    delay: float = 1.0,
-) -> list[str]:
+def _error_status(e: Exception) -> int | None:
+    """Best-effort HTTP status of an exception raised by the Impresso SDK."""
+    for obj in (e, getattr(e, "error", None), getattr(e, "response", None)):
+        for attr in ("status", "status_code"):
+            status = getattr(obj, attr, None) if obj is not None else None
+            if isinstance(status, int):
+                return status
+    return None
+
+
+# Message matching is only a fallback for errors without a status: the text may contain
+# arbitrary numbers (e.g. a random offset=) that look like a status code
+def _is_auth_error(e: Exception) -> bool:
+    status = _error_status(e)
+    s = str(e).lower()
+    if status is not None:
+        return status == 401 or "jwt expired" in s
+    return "401" in s or "unauthorized" in s or "jwt expired" in s
+
+
+def _is_rate_limited(e: Exception) -> bool:
+    status = _error_status(e)
+    if status is not None:
+        return status == 429
+    s = str(e).lower()
+    return "429" in s or "too many requests" in s
+
+
+class Throttle:
     """
-    Sample article UIDs from Impresso API based on a search keyword and date range.
+    Adaptive pacing of API requests (multiplicative decrease / multiplicative increase of the delay).
 
-    The `client` argument can be either an ImpressoClient instance or a callable
-    returning the current client. If a callable is provided, it will be invoked
-    before each API call, enabling transparent client refresh.
+    The delay between request starts shrinks by a fraction `alpha` after every fast,
+    successful response, and is doubled (divided by `beta`) on 429/5xx, honouring
+    `Retry-After` and an exhausted `X-RateLimit-Remaining` (capped at `max_delay`)
+    when the error carries response headers.
+    One instance can be shared by all concurrent tasks, even across event loops.
 
     Args:
-        client (connect): Impresso API client or a callable that returns the client.
-        keyword (str): Keyword to search for.
-        start_date (str | None): Start date for filtering (YYYY-MM-DD format).
-        end_date (str | None): End date for filtering (YYYY-MM-DD format).
-        limit_per_query (int): Maximum number of articles per query.
-        max_hits (int): Maximum number of articles to sample.
-        delay (float): Delay in seconds between API requests.
+        delay (float): Initial delay in seconds between request starts.
+        alpha (float): Fraction by which the delay shrinks after a healthy response.
+        beta (float): Factor applied to the request rate on errors (delay / beta).
+        latency_target (float): Responses slower than this (seconds) grow the delay by `alpha`.
+        min_delay (float): Lower bound for the delay.
+        max_delay (float): Upper bound for the delay.
+    """
 
-    Returns:
-        list[str]: List of sampled article UIDs.
+    def __init__(
+        self,
+        delay: float = 1.0,
+        alpha: float = 0.1,
+        beta: float = 0.5,
+        latency_target: float = 2.0,
+        min_delay: float = 0.05,
+        max_delay: float = 30.0,
+    ):
+        self.delay = delay
+        self.alpha = alpha
+        self.beta = beta
+        self.latency_target = latency_target
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    async def wait(self) -> None:
+        """Sleep until this caller's slot, reserving the next one `delay` seconds later."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.delay
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def record(self, latency: float, error: Exception | None = None) -> None:
+        """Adapt the delay to the outcome of a request that took `latency` seconds."""
+        with self._lock:
+            status = _error_status(error) if error is not None else None
+            if error is not None and (_is_rate_limited(error) or (status is not None and status >= 500)):
+                self.delay = min(self.max_delay, max(self.delay, self.min_delay) / self.beta)
+                pause = _retry_after_seconds(error)
+                if pause:
+                    # A bogus or far-away reset must not stall every worker for good
+                    pause = min(pause, self.max_delay)
+                    self._next_slot = max(self._next_slot, time.monotonic() + pause)
+            elif error is None and latency <= self.latency_target:
+                self.delay = max(self.min_delay, self.delay - self.alpha * self.delay)
+            elif error is None:
+                self.delay = min(self.max_delay, self.delay + self.alpha * self.delay)
+
+
+def _retry_after_seconds(e: Exception) -> float | None:
+    """Pause requested by the server via Retry-After / X-RateLimit-* headers, if exposed."""
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None) or getattr(e, "headers", None)
+    if not headers:
+        return None
+    try:
+        retry_after = headers.get("retry-after")
+        if retry_after is not None:
+            return _seconds_until(float(retry_after))
+        if headers.get("x-ratelimit-remaining") == "0":
+            return _seconds_until(float(headers.get("x-ratelimit-reset", 1.0)))
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def _seconds_until(value: float) -> float:
+    """Header value as a wait in seconds; values past the current epoch are absolute times."""
+    now = time.time()
+    if value > now:
+        return max(0.0, value - now)
+    return max(0.0, value)
+
+
+def _json_dumps(obj: Any, indent: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON, with orjson when available."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode("utf-8")
+
+
+def _json_loads(data: bytes | str) -> Any:
+    """Parse JSON, with orjson when available. Raises ValueError on invalid input."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _year_range(year) -> DateRange:
+    """DateRange covering a calendar year (the year facet returns ints or digit strings)."""
+    y = int(year)
+    date_range = YEAR_RANGES.get(y)
+    if date_range is None:
+        date_range = DateRange(f"{y}-01-01", f"{y}-12-31")
+    return date_range
+
+
+def _facet_cache_key(field: str, keyword: str, start: str | None, end: str | None, limit: int) -> str:
+    return hashlib.sha1(f"{field}|{keyword}|{start}|{end}|{limit}".encode("utf-8")).hexdigest()
+
+
+def _facet_cache_db() -> sqlite3.Connection:
+    """Shared connection to FACET_CACHE_DB; callers hold _FACET_DB_LOCK. Opened (and pruned) once."""
+    global _FACET_DB
+    if _FACET_DB is None:
+        conn = sqlite3.connect(FACET_CACHE_DB, check_same_thread=False)
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS facets (key TEXT PRIMARY KEY, value TEXT NOT NULL, inserted_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS empty_queries (key TEXT PRIMARY KEY, inserted_at REAL NOT NULL)"
+            )
+            # Expired entries are dropped here rather than on every write
+            cutoff = time.time() - FACET_CACHE_TTL_SECONDS
+            conn.execute("DELETE FROM facets WHERE inserted_at < ?", (cutoff,))
+            conn.execute("DELETE FROM empty_queries WHERE inserted_at < ?", (cutoff,))
+        _FACET_DB = conn
+    return _FACET_DB
 
-    Raises:
-        ValueError: If limit_per_query is not between 1 and 100.
-        Exception: If API requests fail.
+
+def facet_cache_close() -> None:
+    """Close the shared cache connection (it is reopened on next use)."""
+    global _FACET_DB
+    with _FACET_DB_LOCK:
+        if _FACET_DB is not None:
+            _FACET_DB.close()
+            _FACET_DB = None
+
+
+def _facet_disk_get(key: str) -> dict | None:
+    try:
+        with _FACET_DB_LOCK:
+            row = _facet_cache_db().execute(
+                "SELECT value FROM facets WHERE key = ? AND inserted_at >= ?",
+                (key, time.time() - FACET_CACHE_TTL_SECONDS),
+            ).fetchone()
+    except sqlite3.Error as e:
+        logging.getLogger(__name__).warning(f"Facet cache read failed: {e}")
+        return None
+    return _json_loads(row[0]) if row is not None else None
+
+
+def _facet_disk_put(key: str, value: dict) -> None:
+    try:
+        with _FACET_DB_LOCK:
+            conn = _facet_cache_db()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO facets (key, value, inserted_at) VALUES (?, ?, ?)",
+                    (key, _json_dumps(value).decode("utf-8"), time.time()),
+                )
+    except sqlite3.Error as e:
+        logging.getLogger(__name__).warning(f"Facet cache write failed: {e}")
+
+
+def _empty_query_key(keyword: str, start: str | None, end: str | None) -> str:
+    return hashlib.sha1(f"{keyword}|{start}|{end}".encode("utf-8")).hexdigest()
+
+
+def load_empty_queries() -> set[str]:
+    """Load (once) the keyword/date-range queries known to have no hits at all."""
+    global _EMPTY_QUERIES
+    if _EMPTY_QUERIES is None:
+        _EMPTY_QUERIES = set()
+        try:
+            with _FACET_DB_LOCK:
+                rows = _facet_cache_db().execute(
+                    "SELECT key FROM empty_queries WHERE inserted_at >= ?",
+                    (time.time() - FACET_CACHE_TTL_SECONDS,),
+                ).fetchall()
+            _EMPTY_QUERIES.update(row[0] for row in rows)
+        except sqlite3.Error as e:
+            logging.getLogger(__name__).warning(f"Empty-query cache read failed: {e}")
+    return _EMPTY_QUERIES
+
+
+def _mark_empty_query(keyword: str, start: str | None, end: str | None) -> None:
+    key = _empty_query_key(keyword, start, end)
+    load_empty_queries().add(key)
+    try:
+        with _FACET_DB_LOCK:
+            conn = _facet_cache_db()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO empty_queries (key, inserted_at) VALUES (?, ?)",
+                    (key, time.time()),
+                )
+    except sqlite3.Error as e:
+        logging.getLogger(__name__).warning(f"Empty-query cache write failed: {e}")
+
+
+def _facet_memory_put(key: str, value: dict) -> None:
+    _FACET_MEMORY[key] = value
+    if len(_FACET_MEMORY) > FACET_CACHE_MEMORY_SIZE:
+        # dicts keep insertion order: drop the oldest entry
+        del _FACET_MEMORY[next(iter(_FACET_MEMORY))]
+
+
+def _client_getter(client: ImpressoClient | Callable[..., ImpressoClient]) -> Callable[..., ImpressoClient]:
+    """
+    Normalise `client` into a getter; providers may accept force=True to refresh, and
+    stale=<client that failed> to skip the refresh if that client was already replaced.
     """
-    logger = logging.getLogger(__name__)
 
-    # Allow the provider to accept an optional force=True kwarg to refresh
-    def get_c(force: bool = False) -> ImpressoClient:
+    def get_c(force: bool = False, stale: ImpressoClient | None = None) -> ImpressoClient:
         if callable(client):
+            if stale is not None:
+                try:
+                    return client(force=force, stale=stale)  # type: ignore[arg-type]
+                except TypeError:
+                    pass  # provider without 'stale' parameter
             try:
                 return client(force=force)  # type: ignore[arg-type]
             except TypeError:
@@ -111,30 +365,106 @@ def sample_impresso_uids(
                 return client()  # type: ignore[misc]
         return client  # type: ignore[return-value]
 
-    def _is_auth_error(e: Exception) -> bool:
-        status = getattr(e, "status", None)
-        s = str(e).lower()
-        return status == 401 or "401" in s or "unauthorized" in s or "jwt expired" in s
+    return get_c
+
+
+async def _sample_async(
+    client: ImpressoClient | Callable[..., ImpressoClient],
+    keyword: str,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    limit_per_query: int = 1,
+    max_hits: int = 20,
+    delay: float = 1.0,
+    concurrency: int = 8,
+    throttle: Throttle | None = None,
+    semaphore: asyncio.Semaphore | None = None,
+    sink: Callable[[str], None] | None = None,
+    executor: ThreadPoolExecutor | None = None,
+) -> list[str] | int:
+    """
+    Async implementation of `sample_impresso_uids`.
+
+    The newspaper searches of a year are issued concurrently (at most `concurrency`
+    in flight, or bounded by a shared `semaphore`). The Impresso SDK is synchronous,
+    so each call runs in a thread of `executor` (the loop's default executor if
+    omitted). Request starts are paced by `throttle`.
+    """
+    logger = logging.getLogger(__name__)
+    loop = asyncio.get_running_loop()
+    get_c = _client_getter(client)
+    sem = semaphore if semaphore is not None else asyncio.Semaphore(concurrency)
+    if throttle is None:
+        throttle = Throttle(delay=delay)
+
+    async def _try_api(desc: str, fn: Callable[[ImpressoClient], dict]) -> dict:
+        async with sem:
+            for attempt in (1, 2):
+                await throttle.wait()
+                t0 = time.monotonic()
+                used: list[ImpressoClient] = []
+
+                def call() -> dict:
+                    # get_c() may refresh the client, so it runs in the worker thread too
+                    c = get_c()
+                    used.append(c)
+                    return fn(c)
 
-    def _try_api(desc: str, fn: Callable[[], dict]) -> dict:
-        try:
-            return fn()
-        except Exception as e:
-            if _is_auth_error(e):
-                logger.warning(f"Auth error during {desc}; refreshing client and retrying once...")
-                # Force-refresh if provider supports it
                 try:
-                    get_c(force=True)
-                except TypeError:
-                    pass  # provider may not support force
-                # Retry once after refresh
-                return fn()
-            raise
+                    result = await loop.run_in_executor(executor, call)
+                except Exception as e:
+                    throttle.record(time.monotonic() - t0, e)
+                    if attempt == 2:
+                        raise
+                    if _is_auth_error(e):
+                        logger.warning(f"Auth error during {desc}; refreshing client and retrying once...")
+                        # Force-refresh if provider supports it. Passing the client that
+                        # failed lets the provider skip the login if another request has
+                        # already replaced it.
+                        try:
+                            await loop.run_in_executor(executor, get_c, True, used[0] if used else None)
+                        except TypeError:
+                            pass  # provider may not support force
+                    elif _is_rate_limited(e) or (_error_status(e) or 0) >= 500:
+                        logger.warning(
+                            f"Server pushed back during {desc}; retrying once with delay"
+                            f" {throttle.delay:.2f}s..."
+                        )
+                    else:
+                        raise
+                    continue
+                throttle.record(time.monotonic() - t0)
+                return result
+
+    async def cache_get(key: str) -> dict | None:
+        # Memory hits are served on the loop; SQLite is only touched from worker threads
+        if key in _FACET_MEMORY:
+            return _FACET_MEMORY[key]
+        value = await loop.run_in_executor(executor, _facet_disk_get, key)
+        if value is not None:
+            _facet_memory_put(key, value)
+        return value
+
+    async def cached_facet(
+        field: str, start: str | None, end: str | None, dr: DateRange | None, limit: int = 200
+    ) -> dict:
+        key = _facet_cache_key(field, keyword, start, end, limit)
+        cached = await cache_get(key)
+        if cached is not None:
+            logger.debug(f"Facet cache hit: {field} for '{keyword}' in {start}..{end}")
+            return cached
+        raw = await _try_api(
+            f"fetch {field} facets",
+            lambda c: c.search.facet(field, term=keyword, date_range=dr, limit=limit).raw,
+        )
+        _facet_memory_put(key, raw)
+        await loop.run_in_executor(executor, _facet_disk_put, key, raw)
+        return raw
 
     logger.info(f"Starting sampling process for keyword: '{keyword}'")
     logger.debug(
         f"Parameters: limit_per_query={limit_per_query}, max_hits={max_hits},"
-        f" delay={delay}"
+        f" delay={throttle.delay}, concurrency={concurrency}"
     )
 
     if not 0 < limit_per_query <= 100:
@@ -145,8 +475,17 @@ def sample_impresso_uids(
             f"Invalid limit_per_query: {limit_per_query}. Must be between 1 and 100."
         )
 
-    sampled_uids = []
-    found = 0
+    # Without a sink the UIDs are collected and returned; with one they are handed over
+    # as soon as they are sampled and only their number is returned
+    sampled_uids: list[str] = []
+    sampled = 0
+
+    def _done() -> list[str] | int:
+        return sampled_uids if sink is None else sampled
+
+    if _empty_query_key(keyword, start_date, end_date) in load_empty_queries():
+        logger.info(f"Skipping '{keyword}': no hits in a previous run")
+        return _done()
 
     # Step 1: Get all years with mentions of the keyword in the date range
     logger.debug("Step 1: Fetching year facets for keyword")
@@ -158,12 +497,17 @@ def sample_impresso_uids(
         logger.info("No date range specified, using all available data.")
 
     try:
-        year_hits = _try_api(
-            "fetch year facets",
-            lambda: get_c().search.facet(
-                "year", term=keyword, date_range=date_range, limit=200
-            ).raw,
-        )
+        year_hits = None
+        if await cache_get(_facet_cache_key("year", keyword, start_date, end_date, 200)) is None:
+            # Cheap existence check first, so that zero-hit agencies cost a one-bucket response
+            preflight = await _try_api(
+                "preflight year facet",
+                lambda c: c.search.facet("year", term=keyword, date_range=date_range, limit=1).raw,
+            )
+            if not preflight.get("data"):
+                year_hits = preflight
+        if year_hits is None:
+            year_hits = await cached_facet("year", start_date, end_date, date_range)
     except Exception as e:
         logger.error(f"Failed to fetch year facets: {e}")
         raise
@@ -173,149 +517,367 @@ def sample_impresso_uids(
 
     if not year_buckets:
         logger.warning(f"No hits found for keyword: '{keyword}'")
-        return []
+        await loop.run_in_executor(executor, _mark_empty_query, keyword, start_date, end_date)
+        return _done()
 
     sorted_year_buckets = sorted(year_buckets, key=lambda b: b.get("value"))
     logger.info(f"Found {len(sorted_year_buckets)} years mentioning '{keyword}'")
     logger.info(f"Years found: {[b.get('value') for b in sorted_year_buckets]}")
 
-    for year_bucket in sorted_year_buckets:
-        year = year_bucket.get("value")
-        if not year:
-            continue
-
-        logger.debug(f"Processing year: {year}")
-        date_range = DateRange(f"{year}-01-01", f"{year}-12-31")
-
-        # Step 2: For each year, get all newspapers with hits
-        logger.info(f"Step 2: Fetching newspaper facets for year {year}")
-        try:
-            newspapers_raw = _try_api(
-                "fetch newspaper facets",
-                lambda yr=year: get_c().search.facet(
-                    "newspaper", term=keyword, date_range=DateRange(f"{yr}-01-01", f"{yr}-12-31"), limit=200
-                ).raw,
-            )
-        except Exception as e:
-            logger.error(f"Failed to fetch newspaper facets for {year}: {e}")
-            continue
-
-        newspaper_buckets = newspapers_raw.get("data", [])
-        logger.info(f"Newspaper facets for {year}: {newspapers_raw}")
-
-        if not newspaper_buckets:
-            logger.warning(f"No newspapers found for year {year}")
-            continue
-
-        logger.debug(f"Found {len(newspaper_buckets)} newspapers for year {year}")
-
-        for paper in newspaper_buckets:
-            newspaper_id = paper.get("value")
-            if not newspaper_id:
-                logger.warning(f"Missing newspaper ID in facet bucket: {paper}")
-                continue
-
-            logger.debug(f"Processing newspaper: {newspaper_id} for year {year}")
-
+    async def _sample_one(newspaper_id: str, year, total: int) -> str | None:
+        logger.debug(f"Searching for articles in {newspaper_id} for year {year}")
+        year_range = _year_range(year)
+        # Draw the article index up front (the facet count gives the number of hits)
+        # and fetch only the page holding it instead of picking from a page of hits
+        for _ in range(2):
+            index = random.randrange(total) if total > 0 else 0
+            offset = index - index % limit_per_query
             try:
-                logger.debug(
-                    f"Searching for articles in {newspaper_id} for year {year}"
-                )
-                results = _try_api(
+                results = await _try_api(
                     "article search",
-                    lambda nid=newspaper_id, yr=year: get_c().search.find(
+                    lambda c: c.search.find(
                         term=keyword,
-                        newspaper_id=nid,
-                        date_range=DateRange(f"{yr}-01-01", f"{yr}-12-31"),
+                        newspaper_id=newspaper_id,
+                        date_range=year_range,
                         with_text_contents=False,
                         limit=limit_per_query,
+                        offset=offset,
                     ).raw,
                 )
-                hits = results.get("data", [])
-                logger.debug(
-                    f"Found {len(hits)} hits for '{newspaper_id}' in {year}. Waiting"
-                    f" for {delay} seconds..."
-                )
-                time.sleep(delay)  # Respectful delay between requests
-
-                if hits:
-                    hit = random.choice(hits)
-                    uid = hit.get("uid")
-                    if uid:
-                        logger.debug(
-                            f"Selected UID: {uid} from {newspaper_id} in {year}"
-                        )
-                        sampled_uids.append(uid)
-                        found += 1
+            except Exception as e:
+                logger.error(f"Error processing '{newspaper_id}' in {year}: {e}")
+                return None
+            hits = results.get("data", [])
+            logger.debug(f"Found {len(hits)} hits for '{newspaper_id}' in {year} at offset {offset}")
+            if hits:
+                break
+            # The facet count can be off; redraw once within the total the search reports
+            reported = (results.get("pagination") or {}).get("total") or 0
+            if offset == 0 or not 0 < reported < total:
+                break
+            total = reported
+        if not hits:
+            logger.debug(f"No results for {newspaper_id} in {year}")
+            return None
+        uid = hits[min(index - offset, len(hits) - 1)].get("uid")
+        if uid:
+            logger.debug(f"Selected UID: {uid} from {newspaper_id} in {year}")
+        return uid
+
+    # Step 2: For each year, get all newspapers with hits. The API has no compound
+    # newspaper x year facet, so the facets of the next FACET_LOOKAHEAD_YEARS years are
+    # prefetched while the current year's articles are sampled. The window stays small so
+    # that stopping at max_hits does not leave many facet requests already issued.
+    years = [b.get("value") for b in sorted_year_buckets if b.get("value")]
+    facet_tasks: dict = {}
+    try:
+        for i, year in enumerate(years):
+            logger.debug(f"Processing year: {year}")
+            for ahead in years[i:i + FACET_LOOKAHEAD_YEARS + 1]:
+                if ahead not in facet_tasks:
+                    facet_tasks[ahead] = asyncio.create_task(
+                        cached_facet("newspaper", f"{ahead}-01-01", f"{ahead}-12-31", _year_range(ahead))
+                    )
+
+            logger.info(f"Step 2: Fetching newspaper facets for year {year}")
+            try:
+                newspapers_raw = await facet_tasks[year]
+            except Exception as e:
+                logger.error(f"Failed to fetch newspaper facets for {year}: {e}")
+                continue
+
+            newspaper_buckets = newspapers_raw.get("data", [])
+            logger.info(f"Newspaper facets for {year}: {newspapers_raw}")
+
+            if not newspaper_buckets:
+                logger.warning(f"No newspapers found for year {year}")
+                continue
+
+            logger.debug(f"Found {len(newspaper_buckets)} newspapers for year {year}")
+
+            newspapers = []
+            for paper in newspaper_buckets:
+                newspaper_id = paper.get("value")
+                if not newspaper_id:
+                    logger.warning(f"Missing newspaper ID in facet bucket: {paper}")
+                    continue
+                newspapers.append((newspaper_id, int(paper.get("count") or 0)))
+
+            # Step 3: one random article per newspaper, searched concurrently. Newspapers
+            # with the most hits go first and only as many searches as the remaining
+            # budget needs are started; a newspaper that yields nothing is replaced by the next.
+            newspapers.sort(key=lambda p: p[1], reverse=True)
+            candidates = iter(newspapers)
+            tasks: set[asyncio.Task] = set()
+
+            def _start_next() -> None:
+                for nid, n in candidates:
+                    tasks.add(asyncio.create_task(_sample_one(nid, year, n)))
+                    return
+
+            for _ in range(min(max_hits - sampled, len(newspapers))):
+                _start_next()
+            try:
+                while tasks:
+                    finished, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    tasks -= finished
+                    for task in finished:
+                        uid = task.result()
+                        if not uid:
+                            _start_next()
+                            continue
+                        if sink is None:
+                            sampled_uids.append(uid)
+                        else:
+                            sink(uid)
+                        sampled += 1
                         logger.info(
-                            f"Progress: {found}/(max.){max_hits} articles sampled"
+                            f"Progress: {sampled}/(max.){max_hits} articles sampled"
                         )
-                        if found >= max_hits:
+                        if sampled >= max_hits:
                             logger.info(
                                 f"Reached maximum number of articles ({max_hits})"
                             )
-                            return sampled_uids
-                else:
-                    logger.debug(f"No results for {newspaper_id} in {year}")
-
-            except Exception as e:
-                logger.error(f"Error processing '{newspaper_id}' in {year}: {e}")
+                            return _done()
+            finally:
+                # Drop searches still in flight once max_hits is reached
+                for task in tasks:
+                    task.cancel()
+    finally:
+        # Facets not needed any more once max_hits is reached
+        for task in facet_tasks.values():
+            task.cancel()
 
     logger.info(
-        f"Sampling completed. Collected {len(sampled_uids)} UIDs for keyword"
+        f"Sampling completed. Collected {sampled} UIDs for keyword"
         f" '{keyword}'"
     )
-    return sampled_uids
+    return _done()
+
+
+def sample_impresso_uids(
+    client: ImpressoClient | Callable[..., ImpressoClient],
+    keyword: str,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    limit_per_query: int = 1,
+    max_hits: int = 20,
+    delay: float = 1.0,
+    concurrency: int = 8,
+    throttle: Throttle | None = None,
+    sink: Callable[[str], None] | None = None,
+) -> list[str] | int:
+    """
+    Sample article UIDs from Impresso API based on a search keyword and date range.
+
+    The `client` argument can be either an ImpressoClient instance or a callable
+    returning the current client. If a callable is provided, it will be invoked
+    before each API call, enabling transparent client refresh.
+
+    Args:
+        client (connect): Impresso API client or a callable that returns the client.
+        keyword (str): Keyword to search for.
+        start_date (str | None): Start date for filtering (YYYY-MM-DD format).
+        end_date (str | None): End date for filtering (YYYY-MM-DD format).
+        limit_per_query (int): Page size of the article searches. The sampled article is
+            drawn at random from all hits; 1 fetches only that article.
+        max_hits (int): Maximum number of articles to sample.
+        delay (float): Initial delay in seconds between API requests; adapted at runtime.
+        concurrency (int): Maximum number of concurrent article searches.
+        throttle (Throttle | None): Shared request pacing; a new one starting at `delay`
+            is created if omitted.
+        sink (Callable[[str], None] | None): If given, called with each UID as soon as
+            it is sampled instead of collecting the UIDs in a list.
+
+    Returns:
+        list[str] | int: List of sampled article UIDs, or their number if `sink` is given.
+
+    Raises:
+        ValueError: If limit_per_query is not between 1 and 100.
+        Exception: If API requests fail.
+    """
+    # One thread per in-flight request; the SDK calls block on network I/O only
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="impresso")
+    try:
+        return asyncio.run(
+            _sample_async(
+                client,
+                keyword=keyword,
+                start_date=start_date,
+                end_date=end_date,
+                limit_per_query=limit_per_query,
+                max_hits=max_hits,
+                delay=delay,
+                concurrency=concurrency,
+                throttle=throttle,
+                sink=sink,
+                executor=executor,
+            )
+        )
+    finally:
+        # Drop searches that were still queued when max_hits was reached
+        executor.shutdown(cancel_futures=True)
+
+
+def _tune_http_pool(client) -> None:
+    """
+    Widen the keep-alive pool of the SDK's httpx client and enable HTTP/2 when `h2` is installed.
+
+    The Impresso client builds its httpx client lazily from `_httpx_args` on the first
+    request, so the options are injected there; clients that do not expose this are
+    left untouched.
+    """
+    logger = logging.getLogger(__name__)
+    api_client = getattr(client, "_api_client", None)
+    httpx_args = getattr(api_client, "_httpx_args", None)
+    if not isinstance(httpx_args, dict) or getattr(api_client, "_client", None) is not None:
+        logger.debug("Impresso client does not expose its httpx settings; keeping defaults")
+        return
+    try:
+        import httpx  # type: ignore
+    except ImportError:
+        return
+    httpx_args["limits"] = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    )
+    try:
+        import h2  # type: ignore  # noqa: F401  (required by httpx for HTTP/2)
+        httpx_args["http2"] = True
+    except ImportError:
+        pass
+    logger.info(f"Impresso HTTP pool: {HTTP_MAX_CONNECTIONS} connections, http2={httpx_args.get('http2', False)}")
 
 
-def _get_impresso_client_lazy():
+def _get_impresso_client_lazy(use_cache: bool = True):
     """Lazy import to avoid static import issues when running from various contexts."""
     logger = logging.getLogger(__name__)
     try:
         from getting_client import get_impresso_client
-        logger.info("Successfully imported get_impresso_client from getting_client.py")
-        return get_impresso_client()
-    except Exception as e1:
-        logger.warning(f"Failed to import from getting_client.py: {e1}")
+    except ImportError as e:
+        logger.error(f"Failed to import from getting_client.py: {e}")
+        raise
+    # A cached token must outlive the refresh margin, or the first request would re-login anyway
+    client = get_impresso_client(use_cache=use_cache, min_validity_seconds=REFRESH_SAFETY_SECONDS)
+    _tune_http_pool(client)
+    return client
+
+
+def _canonicalize(agency: str) -> str:
+    """Key under which spellings of the same agency (case, whitespace) are sampled once."""
+    return " ".join(agency.split()).casefold()
+
+
+def _client_refresh_due(obtained_at: float) -> float:
+    """
+    Time at which a client obtained at `obtained_at` should be recreated: the usual
+    refresh interval, or REFRESH_SAFETY_SECONDS before its token expires if that is sooner
+    (a reused cached token may be close to expiry).
+    """
+    due = obtained_at + CLIENT_REFRESH_INTERVAL_SECONDS - REFRESH_SAFETY_SECONDS
+    try:
+        from getting_client import last_token_expiry
+        exp = last_token_expiry()
+    except ImportError:
+        exp = None
+    if exp is not None:
+        due = min(due, exp - REFRESH_SAFETY_SECONDS)
+    return due
+
+
+def _load_results_jsonl(path: str) -> dict[str, list[str]]:
+    """
+    Replay an append-only results log.
+
+    Records are single-key objects: `{agency: [doc_ids]}` replaces the agency's list
+    (an empty list starts a new attempt), `{agency: doc_id}` streams one more doc_id,
+    and `{agency: count}` marks a streamed agency as finished. Agencies whose stream
+    was never finished (e.g. interrupted run) are left out so that they get resampled.
+    """
+    results: dict[str, list[str]] = {}
+    streaming: dict[str, list[str]] = {}
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = _json_loads(line)
+            except ValueError:
+                continue  # e.g. a line truncated by a crash
+            if not isinstance(record, dict):
+                continue
+            for k, v in record.items():
+                k = str(k)
+                if isinstance(v, list):
+                    results[k] = list(v)
+                    streaming[k] = []
+                elif isinstance(v, str):
+                    streaming.setdefault(k, []).append(v)
+                elif isinstance(v, int):
+                    results[k] = streaming.pop(k, [])
+    return results
+
+
+def _load_results(json_path: str, out_path: str) -> dict[str, list[str]]:
+    """Load the compacted JSON results, then replay the newer JSONL log over them."""
+    logger = logging.getLogger(__name__)
+    results: dict[str, list[str]] = {}
+    if os.path.exists(json_path):
         try:
-            from getting_client import get_impresso_client 
-            logger.info("Successfully imported get_impresso_client from getting_client.py")
-            return get_impresso_client()
-        except Exception as e2:
-            logger.error(f"Failed to import from getting_client.py: {e2}")
-            raise ImportError(
-                "Could not import get_impresso_client from getting_client.py or getting_client.py"
-            ) from e2
+            with open(json_path, "rb") as f:
+                existing = _json_loads(f.read())
+                if isinstance(existing, dict):
+                    # Ensure str -> list[str]
+                    results = {str(k): list(v) for k, v in existing.items()}
+                    logger.info(f"Loaded existing results for {len(results)} agencies from {json_path}")
+        except Exception as e:
+            logger.warning(f"Could not load existing JSON at {json_path}: {e}")
+    if os.path.exists(out_path):
+        try:
+            logged = _load_results_jsonl(out_path)
+            results.update(logged)
+            logger.info(f"Loaded logged results for {len(logged)} agencies from {out_path}")
+        except Exception as e:
+            logger.warning(f"Could not load existing JSONL at {out_path}: {e}")
+    return results
+
+
+def _compact(results: dict[str, list[str]], json_path: str) -> None:
+    """Write the final agency -> [doc_ids] mapping as a single JSON document."""
+    tmp_path = f"{json_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_json_dumps(results, indent=True))
+    os.replace(tmp_path, json_path)
 
 
 def run_all_newsagencies(
     file_path: str = INPUT_NEWSAGENCIES_FILE,
-    out_path: str = OUTPUT_JSON_FILE,
-    limit_per_query: int = 20,
+    out_path: str = OUTPUT_JSONL_FILE,
+    json_path: str = OUTPUT_JSON_FILE,
+    limit_per_query: int = 1,
     max_hits: int = 10000,
     delay: float = 1.0,
     start_date: str | None = None,
     end_date: str | None = None,
+    workers: int = 4,
+    concurrency: int = 16,
 ):
     """
     Iterate over news agencies listed in a text file and collect doc_ids per agency.
-    Saves results incrementally into a JSON dictionary mapping agency -> [doc_ids].
-    The Impresso client is recreated every 7.5 hours to avoid token expiry.
+    doc_ids are streamed to the JSONL log at `out_path` as they are sampled, so they are
+    not held in memory; once all agencies are done the results are compacted into a
+    JSON dictionary mapping agency -> [doc_ids] at `json_path` and the log is emptied.
+    Both files are read back to resume an interrupted run.
+    The Impresso client is recreated every 7.5 hours, or earlier if its token expires sooner.
+
+    `workers` agencies are processed concurrently; they share one client, one
+    throttle and at most `concurrency` in-flight API requests.
     """
     logger = logging.getLogger(__name__)
 
-    # Load existing results if present (to resume)
-    results: dict[str, list[str]] = {}
-    if os.path.exists(out_path):
-        try:
-            with open(out_path, "r", encoding="utf-8") as f:
-                existing = json.load(f)
-                if isinstance(existing, dict):
-                    # Ensure str -> list[str]
-                    results = {str(k): list(v) for k, v in existing.items()}
-                    logger.info(f"Loaded existing results for {len(results)} agencies from {out_path}")
-        except Exception as e:
-            logger.warning(f"Could not load existing JSON at {out_path}: {e}")
+    # Load existing results if present (to resume); only the doc_id counts are kept
+    done = {agency: len(ids) for agency, ids in _load_results(json_path, out_path).items() if ids}
 
     # Read agencies list
     if not os.path.exists(file_path):
@@ -328,24 +890,59 @@ def run_all_newsagencies(
         logger.warning("No agencies found in the input file.")
         return
 
-    logger.info(f"Starting processing of {len(agencies)} agencies from {file_path}")
+    # Repeated entries (same name up to case and whitespace) are sampled only once, under
+    # their first spelling; the other spellings get a copy of its doc_ids at compaction
+    groups: dict[str, list[str]] = {}
+    for agency in agencies:
+        members = groups.setdefault(_canonicalize(agency), [])
+        if agency not in members:
+            members.append(agency)
+
+    logger.info(
+        f"Starting processing of {len(groups)} agencies from {file_path}"
+        f" ({len(agencies) - len(groups)} repeated entries)"
+    )
+
+    # Known zero-hit agencies are skipped without any API call
+    empty = load_empty_queries()
+    logger.info(f"{len(empty)} queries known to have no hits")
+
+    # One pacing controller for the whole run, so what it learns carries over between agencies
+    throttle = Throttle(delay=delay)
 
     # Create initial client
     client = _get_impresso_client_lazy()
-    last_refresh = time.time()
-    last_hint = last_refresh
-
-    def get_client(force: bool = False) -> ImpressoClient:
-        nonlocal client, last_refresh, last_hint
+    refresh_due = _client_refresh_due(time.time())
+    last_hint = time.time()
+    last_login = 0.0  # last refresh that bypassed the token cache
+    # API calls run in worker threads, so refreshes must not interleave
+    client_lock = threading.RLock()
+
+    def get_client(force: bool = False, stale: ImpressoClient | None = None) -> ImpressoClient:
+        with client_lock:
+            return _get_client_locked(force, stale)
+
+    def _get_client_locked(force: bool, stale: ImpressoClient | None) -> ImpressoClient:
+        nonlocal client, refresh_due, last_hint, last_login
         now = time.time()
 
         # Force-refresh (e.g., after 401/jwt expired)
         if force:
+            # Concurrent searches fail together on an expired token; refresh only once.
+            # Callers waiting on the lock during a login find their failed client replaced.
+            if stale is not None and stale is not client:
+                logger.info("Impresso client was already refreshed; reusing it")
+                return client
+            if now - last_login < FORCE_REFRESH_MIN_INTERVAL_SECONDS:
+                logger.info("Impresso client was just refreshed; reusing it")
+                return client
             logger.info("Force-refreshing Impresso client due to authentication error")
             try:
-                client = _get_impresso_client_lazy()
-                last_refresh = now
-                last_hint = now
+                # The cached token is what just got rejected, so log in again
+                client = _get_impresso_client_lazy(use_cache=False)
+                # A browser login can take minutes; measure from when it finished
+                last_hint = last_login = time.time()
+                refresh_due = _client_refresh_due(last_login)
                 logger.info("Successfully force-refreshed Impresso client")
             except Exception as e:
                 logger.error(f"Failed to force-refresh Impresso client: {e}")
@@ -353,7 +950,7 @@ def run_all_newsagencies(
 
         # Periodic hint about time left till refresh
         if now - last_hint >= CLIENT_REFRESH_HINT_INTERVAL_SECONDS:
-            time_left = max(0, (CLIENT_REFRESH_INTERVAL_SECONDS - REFRESH_SAFETY_SECONDS) - int(now - last_refresh))
+            time_left = max(0, int(refresh_due - now))
             hrs = time_left // 3600
             mins = (time_left % 3600) // 60
             secs = time_left % 60
@@ -361,48 +958,114 @@ def run_all_newsagencies(
             last_hint = now
 
         # Refresh a bit before TTL to avoid races
-        if now - last_refresh >= (CLIENT_REFRESH_INTERVAL_SECONDS - REFRESH_SAFETY_SECONDS):
+        if now >= refresh_due:
             logger.info("Refreshing Impresso client due to token TTL")
             try:
-                client = _get_impresso_client_lazy()
-                last_refresh = now  # only update on success
+                client = _get_impresso_client_lazy(use_cache=False)
+                last_login = time.time()
+                refresh_due = _client_refresh_due(last_login)  # only update on success
                 logger.info("Successfully refreshed Impresso client")
             except Exception as e:
                 logger.error(f"Failed to refresh Impresso client: {e}")
-                # Do not update last_refresh so we retry again soon
+                # Do not update refresh_due so we retry again soon
 
         return client
 
-    for idx, agency in enumerate(agencies, start=1):
-        # Skip if already processed
-        if agency in results and isinstance(results[agency], list) and results[agency]:
-            logger.info(f"Skipping agency '{agency}' (already has {len(results[agency])} doc_ids)")
+    # Opened once for the run; all writes happen on the event loop thread
+    out_f = None
+    finished_since_fsync = 0
+
+    def _append_record(agency: str, value: list[str] | str | int) -> None:
+        out_f.write(_json_dumps({agency: value}) + b"\n")
+
+    def _sync() -> None:
+        nonlocal finished_since_fsync
+        out_f.flush()
+        os.fsync(out_f.fileno())
+        finished_since_fsync = 0
+
+    queue: asyncio.Queue[tuple[int, str]] = asyncio.Queue()
+    for idx, members in enumerate(groups.values(), start=1):
+        # Skip if already processed (under any of its spellings)
+        finished = next((m for m in members if done.get(m)), None)
+        if finished is not None:
+            logger.info(f"Skipping agency '{finished}' (already has {done[finished]} doc_ids)")
             continue
+        queue.put_nowait((idx, members[0]))
 
-        logger.info(f"[{idx}/{len(agencies)}] Processing agency: {agency}")
-        try:
-            doc_ids = sample_impresso_uids(
-                get_client,  # provider can force-refresh on 401
-                keyword=agency,
-                start_date=start_date,
-                end_date=end_date,
-                limit_per_query=limit_per_query,
-                max_hits=max_hits,
-                delay=delay,
-            )
-            results[agency] = doc_ids
-            logger.info(f"Collected {len(doc_ids)} doc_ids for '{agency}'")
-        except Exception as e:
-            logger.error(f"Failed processing '{agency}': {e}")
-            results[agency] = []
+    async def worker(http_sem: asyncio.Semaphore, executor: ThreadPoolExecutor) -> None:
+        nonlocal finished_since_fsync
+        while True:
+            try:
+                idx, agency = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
 
-        # Persist incrementally after each agency
+            logger.info(f"[{idx}/{len(groups)}] Processing agency: {agency}")
+            # Start a fresh attempt: drops doc_ids streamed by an interrupted earlier run
+            _append_record(agency, [])
+            try:
+                count = await _sample_async(
+                    get_client,  # provider can force-refresh on 401
+                    keyword=agency,
+                    start_date=start_date,
+                    end_date=end_date,
+                    limit_per_query=limit_per_query,
+                    max_hits=max_hits,
+                    delay=delay,
+                    throttle=throttle,
+                    semaphore=http_sem,
+                    executor=executor,
+                    sink=lambda uid, agency=agency: _append_record(agency, uid),
+                )
+                logger.info(f"Collected {count} doc_ids for '{agency}'")
+            except Exception as e:
+                logger.error(f"Failed processing '{agency}': {e}")
+                # Unfinished stream: the agency is resampled on the next run
+                continue
+
+            # Mark the agency as finished; the buffer is only synced every few agencies
+            _append_record(agency, count)
+            finished_since_fsync += 1
+            if finished_since_fsync >= FSYNC_EVERY_AGENCIES:
+                try:
+                    _sync()
+                    logger.info(f"Saved progress to {out_path}")
+                except OSError as e:
+                    logger.error(f"Failed to sync {out_path}: {e}")
+
+    async def run_pool(executor: ThreadPoolExecutor) -> None:
+        # Shared by all workers: one cap on in-flight requests
+        http_sem = asyncio.Semaphore(concurrency)
+        await asyncio.gather(*(worker(http_sem, executor) for _ in range(workers)))
+
+    with open(out_path, "ab", buffering=OUTPUT_BUFFER_BYTES) as out_f:
         try:
-            with open(out_path, "w", encoding="utf-8") as f:
-                json.dump(results, f, ensure_ascii=False, indent=2)
-            logger.info(f"Saved progress to {out_path}")
-        except Exception as e:
-            logger.error(f"Failed to write JSON to {out_path}: {e}")
+            # Sized to the request cap, so every permitted request gets a thread
+            executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="impresso")
+            try:
+                asyncio.run(run_pool(executor))
+            finally:
+                executor.shutdown(cancel_futures=True)
+                facet_cache_close()
+        finally:
+            # Also on Ctrl-C/errors: keep what was sampled so far
+            _sync()
+
+    try:
+        results = _load_results(json_path, out_path)
+        for members in groups.values():
+            sampled = next((results[m] for m in members if results.get(m)), None)
+            if sampled is not None:
+                for m in members:
+                    if not results.get(m):
+                        results[m] = sampled
+        _compact(results, json_path)
+        logger.info(f"Wrote {len(results)} agencies to {json_path}")
+        # Everything in the log is now in the JSON file; start the next run with an empty log
+        open(out_path, "wb").close()
+    except Exception as e:
+        logger.error(f"Failed to write JSON to {json_path}: {e}")
 
     logger.info("All agencies processed.")
 
@@ -411,8 +1074,9 @@ if __name__ == "__main__":
     # Batch process all agencies from file and save results incrementally
     run_all_newsagencies(
         file_path=INPUT_NEWSAGENCIES_FILE,
-        out_path=OUTPUT_JSON_FILE,
-        limit_per_query=20,
+        out_path=OUTPUT_JSONL_FILE,
+        json_path=OUTPUT_JSON_FILE,
+        limit_per_query=1,
         max_hits=10000,
         delay=1.0,
         # Optionally constrain by dates: